@@ -1,8 +1,8 @@
+import functools
+
 import numpy as np
 import scipy as sp
-import collections
 import torch
-import functools
 
 from .data_util import form_lag_matrix
 from sklearn.utils.extmath import randomized_svd
@@ -506,71 +506,31 @@ def calc_pi_from_cross_cov_mats_block_toeplitz(cross_cov_mats, proj=None):
 """
 
 
-class memoized(object):
-    """Decorator for memoization.
-    From: https://wiki.python.org/moin/PythonDecoratorLibrary.
-
-    Caches a function's return value each time it is called.
-    If called later with the same arguments, the cached value is returned
-    (not reevaluated).
-    """
-    def __init__(self, func):
-        self.func = func
-        self.cache = {}
-
-    def __call__(self, *args):
-        if not isinstance(args, collections.Hashable):
-            # uncacheable. a list, for instance.
-            # better to not cache than blow up.
-            return self.func(*args)
-        if args in self.cache:
-            return self.cache[args]
-        else:
-            value = self.func(*args)
-            self.cache[args] = value
-            return value
-
-    def __repr__(self):
-        # Return the function's docstring.
-        return self.func.__doc__
-
-    def __get__(self, obj, objtype):
-        # Support instance methods.
-        return functools.partial(self.__call__, obj)
-
-
-@memoized
-def pv_permutation(T, N):
-    A = np.arange((T * N)**2, dtype=np.int).reshape((T * N, T * N))
-    A_perm = np.zeros((T**2, N**2), dtype=np.int)
-    for i in range(T):
-        for j in range(T):
-            row_idx = i * T + j
-            A_block = A[i * N:(i + 1) * N, j * N:(j + 1) * N]
-            A_perm[row_idx, :] = A_block.T.reshape((N**2,))  # equivalent to I_block.vectorize
-    perm = A_perm.ravel()
-    perm_inv = perm.argsort()
-    return perm, perm_inv
-
-
 def pv_rearrange(C, T, N):
-    perm, _ = pv_permutation(T, N)
-    C_prime = C.ravel()[perm].reshape((T**2, N**2))
+    """Pitsianis-VanLoan rearrangement. Row (i*T + j) of the output is the
+    (column-major) vectorization of the (i, j)-th N-by-N block of C.
+    Implemented as a pure reshape + transpose, so no permutation table is needed.
+    """
+    C_prime = C.reshape(T, N, T, N).transpose(0, 2, 3, 1).reshape(T**2, N**2)
     return C_prime
 
 
 def pv_rearrange_inv(C, T, N):
-    _, perm_inv = pv_permutation(T, N)
-    C_prime = C.ravel()[perm_inv].reshape((T * N, T * N))
+    """Inverts the action of pv_rearrange."""
+    C_prime = C.reshape(T, T, N, N).transpose(0, 3, 1, 2).reshape(T * N, T * N)
     return C_prime
 
 
+@functools.lru_cache(maxsize=8)
 def build_P(T):
+    """Build the Toeplitz-averaging map with one scatter rather than a loop
+    over diagonal offsets. P only depends on T, so it is cached across the
+    cross-validation grid. Callers must not mutate the returned array.
+    """
+    i, j = np.indices((T, T))
+    offsets, cols = (i - j).ravel(), (i * T + j).ravel()
     P = np.zeros((2 * T - 1, T**2))
-    idx = np.arange(T**2).reshape((T, T)).T + 1
-    for offset in range(-T + 1, T):
-        diag_idx = np.diagonal(idx, offset=offset)
-        P[offset + T - 1, diag_idx - 1] = 1. / np.sqrt(T - np.abs(offset))
+    P[offsets + T - 1, cols] = 1. / np.sqrt(T - np.abs(offsets))
     return P
 
 
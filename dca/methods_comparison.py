@@ -198,13 +198,16 @@ def calc_big_K(T, n_factors, tau, var_n, out=None):
         K = np.zeros((T * n_factors, T * n_factors))
     else:
         K = out
-    for delta_t in range(T):
-        diag = calc_K(tau, delta_t, var_n)
-        diag = np.tile(diag, T - delta_t)
-        idxs_0 = np.arange(0, (T - delta_t) * n_factors)
-        idxs_1 = np.arange(delta_t * n_factors, T * n_factors)
-        K[idxs_0, idxs_1] = diag
-        K[idxs_1, idxs_0] = diag
+    var_f = 1. - var_n
+    t_vals = np.arange(T)
+    delta_t = t_vals[:, np.newaxis] - t_vals[np.newaxis, :]
+    # (T, T, n_factors) kernel for all timescales in one vectorized pass
+    taus = np.broadcast_to(np.atleast_1d(tau), (n_factors,))
+    K1d = var_f * np.exp(-delta_t[:, :, np.newaxis]**2 / (2. * taus**2))
+    K1d[t_vals, t_vals] += var_n
+    K_view = K.reshape(T, n_factors, T, n_factors)
+    for f in range(n_factors):
+        K_view[:, f, :, f] = K1d[..., f]
     return K
 
 
@@ -215,8 +218,10 @@ def make_block_diag(M, num_reps, out=None):
         big_M = np.zeros((M.shape[0] * num_reps, M.shape[1] * num_reps))
     else:
         big_M = out
-    for i in range(num_reps):
-        big_M[i * M.shape[0]:(i + 1) * M.shape[0], i * M.shape[1]:(i + 1) * M.shape[1]] = M
+    # one advanced-index write onto the block diagonal of a reshaped view
+    # instead of num_reps Python-level slice assignments
+    reps = np.arange(num_reps)
+    big_M.reshape(num_reps, M.shape[0], num_reps, M.shape[1])[reps, :, reps] = M
     return big_M
 
 
@@ -258,6 +263,37 @@ def block_dot_AB(A, B, n_blocks, out=None):
     return out
 
 
+def block_diag_add(A, M, n_blocks, out=None):
+    """Computes A + make_block_diag(M, n_blocks) for diagonal M without
+    materializing the (n_blocks * n)^2 mostly-zero block-diagonal buffer.
+    The sum is written into A in place (out is accepted for symmetry with
+    the other block helpers).
+    """
+    if out is None:
+        out = A
+    elif out is not A:
+        np.copyto(out, A)
+    out.flat[::out.shape[1] + 1] += np.tile(np.diag(M), n_blocks)
+    return out
+
+
+def big_K_dot_Ct(K, C, T):
+    """Computes np.dot(K, make_block_diag(C.T, T)) for a GP kernel K which
+    only couples equal latent factors (as built by calc_big_K).
+
+    Since K[i*nf + f, j*nf + g] is zero for f != g, the product reduces to
+    broadcasting each factor's T-by-T Toeplitz block against the
+    corresponding column of C, an O(T^2 * nf * n) operation instead of the
+    O(T^2 * nf^2 * n) dense block multiply.
+    """
+    n, nf = C.shape
+    f_idx = np.arange(nf)
+    # (nf, T, T) stack of the per-factor kernels
+    Kf = K.reshape(T, nf, T, nf)[:, f_idx, :, f_idx]
+    KCt = np.einsum('fij,nf->ifjn', Kf, C)
+    return KCt.reshape(T * nf, T * n)
+
+
 def matrix_inversion_identity(R_inv, K, C, T):
     """Computes (R + CKC^T)^{-1} using the matrix inversion identity as
     R^{-1} - R^{-1}C(K^{-1} + C^TR^{-1}C)^{-1}C^TR^{-1}
@@ -279,12 +315,18 @@ def log_likelihood(mu, sigma, y, T):
     Only works for 1 sample data.
     """
     ll = 0.
+    # sigma is SPD, so a single Cholesky factorization gives both the logdet
+    # and the quadratic form at half the cost of an LU-based solve. The
+    # factor is cached since sigma[Ti] is shared by all samples of length Ti.
+    chol = {}
     for yi, Ti in zip(y, T):
         d = yi.size
-        log_det_cov = np.linalg.slogdet(sigma[Ti])[1]
+        if Ti not in chol:
+            chol[Ti] = scipy.linalg.cho_factor(sigma[Ti], lower=True, check_finite=False)
+        log_det_cov = 2. * np.sum(np.log(np.diag(chol[Ti][0])))
         y_minus_mean = yi - mu[Ti]
         term3 = np.dot(y_minus_mean.T.ravel(),
-                       np.linalg.solve(sigma[Ti], y_minus_mean.T).ravel())
+                       scipy.linalg.cho_solve(chol[Ti], y_minus_mean.T).ravel())
         ll += (-0.5 * d * np.log(2 * np.pi) - 0.5 * log_det_cov - 0.5 * term3)
     return ll
 
@@ -345,7 +387,7 @@ class GaussianProcessFactorAnalysis(object):
         C = self.C_
         R = self.R_
         big_K = {Ti: calc_big_K(Ti, self.n_factors, self.tau_, self.var_n) for Ti in set(T)}
-        y_cov = {Ti: block_dot_B(block_dot_A(C, big_K[Ti], Ti), C.T, Ti) + make_block_diag(R, Ti)
+        y_cov = {Ti: block_diag_add(block_dot_A(C, big_K_dot_Ct(big_K[Ti], C, Ti), Ti), R, Ti)
                  for Ti in set(T)}
         big_d = {Ti: np.tile(self.d_, Ti) for Ti in set(T)}
         big_y = [yi.ravel() for yi in y]
@@ -379,9 +421,11 @@ class GaussianProcessFactorAnalysis(object):
         C = self.C_
         R = self.R_
 
-        mean, big_K, big_dy, KCt, KCt_CKCtR_inv = self._E_mean(y)
+        # Reuse the big_K buffers allocated in fit rather than reallocating
+        # (T * n_factors)^2 arrays every EM iteration.
+        mean, big_K, big_dy, KCt, KCt_CKCtR_inv = self._E_mean(y, big_K)
         cov = {Ti: big_K[Ti] - KCt_CKCtR_inv[Ti].dot(KCt[Ti].T) for Ti in set(T)}
-        y_cov = {Ti: block_dot_A(C, KCt[Ti], Ti) + make_block_diag(R, Ti)
+        y_cov = {Ti: block_diag_add(block_dot_A(C, KCt[Ti], Ti), R, Ti)
                  for Ti in set(T)}
 
         if self.verbose == 2:
@@ -394,9 +438,10 @@ class GaussianProcessFactorAnalysis(object):
         nf = self.n_factors
         xxp = np.zeros((nf + 1, nf + 1))
         for Ti, big_xxpi in zip(T, big_xxp):
-            for t in range(Ti):
-                sl = slice(t * nf, (t + 1) * nf)
-                xxp[:nf, :nf] += big_xxpi[sl, sl]
+            # sum the Ti diagonal nf-by-nf blocks with one gather instead of
+            # Ti Python-level slice reads
+            reps = np.arange(Ti)
+            xxp[:nf, :nf] += big_xxpi.reshape(Ti, nf, Ti, nf)[reps, :, reps].sum(axis=0)
         xxp[-1, -1] = sum(T)
         sum_x = sum([xi.sum(axis=0) for xi in x])
         xxp[:-1, -1] = sum_x
@@ -407,22 +452,22 @@ class GaussianProcessFactorAnalysis(object):
         self.C_ = Cd[:, :-1]
         if self.verbose == 2:
             # Compute log likelihood under current params
-            ll = self._calc_loglikelihood(y)
+            ll = self._calc_loglikelihood(y, big_K)
             print("C_ update log likelihood:", ll)
         self.d_ = Cd[:, -1]
         if self.verbose == 2:
             # Compute log likelihood under current params
-            ll = self._calc_loglikelihood(y)
+            ll = self._calc_loglikelihood(y, big_K)
             print("d_ update log likelihood:", ll)
         dy = [yi - self.d_[np.newaxis] for yi in y]
         self.R_ = sum([np.diag(np.diag(dyi.T.dot(dyi) - dyi.T.dot(xi).dot(self.C_.T)))
                        for dyi, xi in zip(dy, x)]) / sum(T)
         if self.verbose == 2:
             # Compute log likelihood under current params
-            ll = self._calc_loglikelihood(y)
+            ll = self._calc_loglikelihood(y, big_K)
             print("Exact update log likelihood:", ll)
         self.tau_ = self._optimize_tau(self.tau_, T, big_xxp, big_K)
-        ll = self._calc_loglikelihood(y)
+        ll = self._calc_loglikelihood(y, big_K)
         if self.verbose == 2:
             # Compute log likelihood under current params
             print("tau update log likelihood:", ll)
@@ -432,15 +477,15 @@ class GaussianProcessFactorAnalysis(object):
             print()
         return ll
 
-    def _calc_loglikelihood(self, y):
+    def _calc_loglikelihood(self, y, big_K=None):
         T = [yi.shape[0] for yi in y]
         big_d = {Ti: np.tile(self.d_, Ti) for Ti in set(T)}
         big_y = [yi.ravel() for yi in y]
         C = self.C_
         R = self.R_
 
-        mean, big_K, big_dy, KCt, KCt_CKCtR_inv = self._E_mean(y)
-        y_cov = {Ti: block_dot_A(C, KCt[Ti], Ti) + make_block_diag(R, Ti)
+        mean, big_K, big_dy, KCt, KCt_CKCtR_inv = self._E_mean(y, big_K)
+        y_cov = {Ti: block_diag_add(block_dot_A(C, KCt[Ti], Ti), R, Ti)
                  for Ti in T}
         return log_likelihood(big_d, y_cov, big_y, T)
 
@@ -474,27 +519,37 @@ class GaussianProcessFactorAnalysis(object):
         def f_df(big_K, log_tau):
             big_K = {Ti: calc_big_K(Ti, self.n_factors, np.exp(log_tau), self.var_n, big_K[Ti])
                      for Ti in set(T)}
-            K_inv = {Ti: np.linalg.inv(big_K[Ti]) for Ti in set(T)}
-            f = sum([-.5 * (np.sum(K_inv[Ti] * Sigma_mu_mu_xi) +
-                            np.linalg.slogdet(2. * np.pi * big_K[Ti])[1])
+            # Cholesky rather than explicit inverse + slogdet: big_K is SPD, so
+            # tr(K^-1 S) = tr(cho_solve(L, S)) and log|K| reads off the factor
+            chol = {Ti: scipy.linalg.cho_factor(big_K[Ti], lower=True, check_finite=False)
+                    for Ti in set(T)}
+            log_det = {Ti: (2. * np.sum(np.log(np.diag(chol[Ti][0]))) +
+                            Ti * self.n_factors * np.log(2. * np.pi))
+                       for Ti in set(T)}
+            f = sum([-.5 * (np.trace(scipy.linalg.cho_solve(chol[Ti], Sigma_mu_mu_xi,
+                                                            check_finite=False)) +
+                            log_det[Ti])
                      for Ti, Sigma_mu_mu_xi in zip(T, Sigma_mu_mu_x)])
 
             df = np.zeros_like(log_tau)
+            tau = np.exp(log_tau)
             t_vals = [np.arange(Ti)[np.newaxis] for Ti in T]
             delta_t = [t_valsi - t_valsi.T for t_valsi in t_vals]
             for batch_idx, Tb in enumerate(T):
                 Kb = big_K[Tb]
                 Sigma_mu_mu_xb = Sigma_mu_mu_x[batch_idx]
                 delta_tb = delta_t[batch_idx]
-                for ii, lti in enumerate(log_tau):
-                    idxs = ii + (np.arange(Tb) * self.n_factors)
-                    Ki = Kb[idxs, :][:, idxs]
-                    Ki_inv = np.linalg.inv(Ki)
-                    xpx = Sigma_mu_mu_xb[idxs, :][:, idxs]
-                    dEdKi = .5 * (-Ki_inv + Ki_inv.dot(xpx).dot(Ki_inv))
-                    dKidti = (var_f * (delta_tb**2 / np.exp(lti)**3) *
-                              np.exp(-delta_tb**2 / (2 * np.exp(lti)**2)))
-                    df[ii] += np.trace(np.dot(dEdKi.T, dKidti)) * np.exp(lti)
+                # gather the (n_factors, Tb, Tb) per-factor blocks once and
+                # batch the inverses/products across factors
+                idxs = (np.arange(self.n_factors)[:, np.newaxis] +
+                        np.arange(Tb)[np.newaxis] * self.n_factors)
+                Ki = Kb[idxs[:, :, np.newaxis], idxs[:, np.newaxis, :]]
+                Ki_inv = np.linalg.inv(Ki)
+                xpx = Sigma_mu_mu_xb[idxs[:, :, np.newaxis], idxs[:, np.newaxis, :]]
+                dEdKi = .5 * (-Ki_inv + np.einsum('fij,fjk,fkl->fil', Ki_inv, xpx, Ki_inv))
+                dKidti = (var_f * (delta_tb**2 / tau[:, np.newaxis, np.newaxis]**3) *
+                          np.exp(-delta_tb**2 / (2 * tau[:, np.newaxis, np.newaxis]**2)))
+                df += np.einsum('fij,fij->f', dEdKi, dKidti) * tau
             if self.verbose == 2:
                 print('tau opt', f)
 
@@ -525,7 +580,7 @@ class GaussianProcessFactorAnalysis(object):
                  for Ti in set(T)}
         R_inv = np.linalg.inv(self.R_)
         big_dy = [big_yi - big_di for big_yi, big_di in zip(big_y, big_d)]
-        KCt = {Ti: block_dot_B(big_K[Ti], self.C_.T, Ti) for Ti in set(T)}
+        KCt = {Ti: big_K_dot_Ct(big_K[Ti], self.C_, Ti) for Ti in set(T)}
 
         KCt_CKCtR_inv = {Ti: KCt[Ti].dot(matrix_inversion_identity(R_inv, big_K[Ti], self.C_, Ti))
                          for Ti in T}
@@ -583,13 +638,18 @@ class SlowFeatureAnalysis(object):
             X = [X]
         self.mean_ = np.concatenate(X).mean(axis=0, keepdims=True)
         X_stan = [Xi - self.mean_ for Xi in X]
-        uX, sX, vhX = np.linalg.svd(np.concatenate(X_stan), full_matrices=False)
-        whiten = vhX.T @ np.diag(1. / sX)
+        X_all = np.concatenate(X_stan)
+        # Eigendecomposition of the d-by-d Gram matrix rather than a full SVD
+        # of the (time, d) data matrix, whose left singular vectors are never
+        # used. eigh returns ascending eigenvalues, so the second stage keeps
+        # the leading (smallest derivative-variance, i.e. slowest) columns.
+        wX, vX = np.linalg.eigh(X_all.T @ X_all)
+        whiten = vX / np.sqrt(np.maximum(wX, 1e-12))
         Xw = [X_stani @ whiten for X_stani in X_stan]
         Xp = [np.diff(Xwi, axis=0) for Xwi in Xw]
-        up, sp, vhp = np.linalg.svd(np.concatenate(Xp), full_matrices=False)
-        proj = vhp.T
-        self.all_coef_ = whiten @ proj[:, ::-1]
+        Xp_all = np.concatenate(Xp)
+        wp, vp = np.linalg.eigh(Xp_all.T @ Xp_all)
+        self.all_coef_ = whiten @ vp
         self.all_coef_ /= np.linalg.norm(self.all_coef_, axis=0, keepdims=True)
         self.coef_ = self.all_coef_[:, :self.n_components]
         return self
@@ -8,69 +8,13 @@ I'm not sure what Eq. 16 is trying to acomplish (it seems...wrong).
 My implemntation should do this step correctly (see 'build_P(pt)').
 """
 
-import numpy as np
-import scipy.linalg
-import collections
 import functools
 
-class memoized(object):
-   """Decorator. Caches a function's return value each time it is called.
-   If called later with the same arguments, the cached value is returned
-   (not reevaluated).
-   From: https://wiki.python.org/moin/PythonDecoratorLibrary.
-   """
-   def __init__(self, func):
-      self.func = func
-      self.cache = {}
-   def __call__(self, *args):
-      if not isinstance(args, collections.Hashable):
-         # uncacheable. a list, for instance.
-         # better to not cache than blow up.
-         return self.func(*args)
-      if args in self.cache:
-         return self.cache[args]
-      else:
-         value = self.func(*args)
-         self.cache[args] = value
-         return value
-   def __repr__(self):
-      #Return the function's docstring.
-      return self.func.__doc__
-   def __get__(self, obj, objtype):
-      #Support instance methods.
-      return functools.partial(self.__call__, obj)
-
-@memoized
-def pv_permutation(ps, pt):
-    """Permutation on {0, ..., ps^2*pt^2 - 1} corresponding to
-    Pitsianis-VanLoan rearrangement. See pv_rearrange for more
-    information on how Pitsianis-VanLoan rearrangement works.
-
-    Parameters
-    ----------
-    ps : int
-        Number of spatial dimensions.
-    pt : int
-        Number of temporal dimensions.
-
-    Returns
-    ----------
-    perm : np.ndarray
-        perm[i] is the index which the i-th element of A.ravel()
-        gets sent to under Pitsianis-VanLoan rearrangement.
-    perm_inv : np.ndarray
-        The inverse of perm.
-    """
-    I = np.arange(ps**2 * pt**2, dtype=np.int).reshape((ps*pt, ps*pt))
-    I_perm = np.zeros(( pt**2, ps**2 ), dtype=np.int)
-    for i in range(pt):
-        for j in range(pt):
-            row_idx =  i*pt + j
-            I_block = I[i*ps:(i+1)*ps, j*ps:(j+1)*ps]
-            I_perm[row_idx, :] = I_block.T.reshape((ps**2,)) #this is equivalent to I_block.vectorize
-    perm = I_perm.ravel()
-    perm_inv = perm.argsort()
-    return perm, perm_inv
+import numpy as np
+import scipy.linalg
+from joblib import Parallel, delayed
+from sklearn.utils.extmath import randomized_svd
+from threadpoolctl import threadpool_limits
 
 def pv_rearrange(C, ps, pt):
     """Given a ps*pt-by-ps*pt matrix C, Pitsianis-VanLoan rearrangement
@@ -103,8 +47,7 @@ def pv_rearrange(C, ps, pt):
     C_prime : np.ndarray, shape (pt^2, ps^2)
         Rearranged matrix.
     """
-    perm, _ = pv_permutation(ps, pt)
-    C_prime = C.ravel()[perm].reshape((pt**2, ps**2))
+    C_prime = C.reshape(pt, ps, pt, ps).transpose(0, 2, 3, 1).reshape(pt**2, ps**2)
     return C_prime
 
 def pv_rearrange_inv(C, ps, pt):
@@ -124,29 +67,52 @@ def pv_rearrange_inv(C, ps, pt):
     C_prime : np.ndarray, shape (ps*pt, ps*pt)
         Un-rearranged matrix.
     """
-    _, perm_inv = pv_permutation(ps, pt)
-    C_prime = C.ravel()[perm_inv].reshape((ps*pt, ps*pt))
+    C_prime = C.reshape(pt, pt, ps, ps).transpose(0, 3, 1, 2).reshape(ps*pt, ps*pt)
     return C_prime
 
-def soft_sv_threshold(M, lambda_param):
+def soft_sv_threshold(M, lambda_param, k_guess=None, oversample=5):
     """Soft singular value thresholding operator.
 
+    When k_guess (e.g. the rank retained by the previous proximal iteration)
+    plus the oversampling margin is small relative to min(M.shape), only the
+    top k_guess + oversample components are computed with a randomized SVD
+    at cost O(m*n*k) instead of a full O(min(m, n)^2 * max(m, n)) SVD. If the
+    smallest retained singular value still exceeds the threshold, k_guess was
+    an underestimate and we fall back to the full SVD.
+
     Parameters
     ----------
     M : np.ndarray, shape (m, n)
         Matrix whose singular values will be soft-thresholded.
     lambda_param : float
         How much to subtract from each singular value.
+    k_guess : int or None
+        Guess for the rank retained after thresholding. None means
+        a full SVD is used.
+    oversample : int
+        How many extra components to compute beyond k_guess.
 
     Returns
     ----------
     soft_thresholded_M : np.ndarray, shape (m, n)
         M with soft-thresholded singular values.
+    rank : int
+        Number of singular values surviving the threshold.
     """
-    U, s, Vh = scipy.linalg.svd(M, full_matrices=False)
+    if k_guess is not None and k_guess + oversample < min(M.shape):
+        U, s, Vh = randomized_svd(M, n_components=k_guess + oversample,
+                                  n_iter=2, random_state=0)
+        transformed_svs = np.maximum(s - lambda_param, 0)
+        if transformed_svs[-1] == 0:
+            k = int(np.count_nonzero(transformed_svs))
+            return np.dot(U[:, :k]*transformed_svs[:k], Vh[:k]), k
+    U, s, Vh = scipy.linalg.svd(M, full_matrices=False, lapack_driver='gesdd',
+                                check_finite=False)
     transformed_svs = np.maximum(s - lambda_param, 0)
-    soft_thresholded_M = np.dot(U, np.dot(np.diag(transformed_svs), Vh))
-    return soft_thresholded_M
+    k = int(np.count_nonzero(transformed_svs))
+    #broadcast multiply instead of a diag GEMM; truncating to the surviving
+    #rank k cuts the reconstruction cost from m*n*min(m,n) to m*n*k
+    return np.dot(U[:, :k]*transformed_svs[:k], Vh[:k]), k
 
 def soft_entrywise_threshold(M, lambda_param):
     """Entrywise soft thresholding operator.
@@ -166,6 +132,45 @@ def soft_entrywise_threshold(M, lambda_param):
     soft_thresholded_M = np.sign(M)*np.maximum(np.abs(M) - lambda_param, 0)
     return soft_thresholded_M
 
+def _prox_grad_step(M_prev, L_prev, L_new, R, tau, tau_lambda_S, c_vec, S_out, M_out):
+    """Fused non-SVD body of one proximal-gradient iteration.
+
+    Writes the entrywise soft-threshold update for S and the gradient step
+    for M into the preallocated S_out and M_out buffers. c_vec holds the
+    per-row Toeplitz normalization 1/sqrt(pt - |j|). S_out may alias the
+    previous S (it is never read), M_out must not alias M_prev.
+    """
+    #per-row thresholds broadcast against the precomputed c_vec: a few
+    #in-place ufunc calls instead of 2*pt - 1 Python-level row updates,
+    #with M_out doubling as scratch for M_prev - L_prev
+    np.subtract(M_prev, L_prev, out=M_out)
+    np.abs(M_out, out=S_out)
+    S_out -= tau_lambda_S*c_vec[:, np.newaxis]
+    np.maximum(S_out, 0, out=S_out)
+    np.copysign(S_out, M_out, out=S_out)
+    np.add(L_new, S_out, out=M_out)
+    M_out -= tau*(M_out - R)
+
+try:
+    import numba
+
+    #single prange pass over the (2*pt - 1, ps**2) matrices instead of
+    #several full numpy passes; the workload is memory-bound so fusing the
+    #elementwise ops roughly halves the bandwidth per iteration
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _prox_grad_step(M_prev, L_prev, L_new, R, tau, tau_lambda_S, c_vec, S_out, M_out):  # noqa: F811
+        for i in numba.prange(c_vec.size):
+            thr = tau_lambda_S*c_vec[i]
+            for j in range(M_prev.shape[1]):
+                a = M_prev[i, j] - L_prev[i, j]
+                s = np.sign(a)*max(abs(a) - thr, 0.)
+                S_out[i, j] = s
+                ls = L_new[i, j] + s
+                M_out[i, j] = ls - tau*(ls - R[i, j])
+except ImportError:
+    pass
+
+@functools.lru_cache(maxsize=8)
 def build_P(pt):
     """Builds a matrix P which maps a pt^2-by-ps^2 PV-rearranged
     version of a matrix M to a (2*pt - 1)-by-ps^2 version of M
@@ -188,11 +193,12 @@ def build_P(pt):
         Toeplitz-fying map from pt^2-by-ps^2 a PV-rearranged matrix
         to a (2*ps - 1) PV-rearranged matrix.
     """
+    #one scatter instead of a loop over diagonal offsets; cached on pt since
+    #P is rebuilt for every (lambda_L, lambda_S, fold) combination
+    i, j = np.indices((pt, pt))
+    offsets, cols = (i - j).ravel(), (i*pt + j).ravel()
     P = np.zeros((2*pt - 1, pt**2))
-    idx = np.arange(pt**2).reshape((pt, pt)).T + 1
-    for offset in range(-pt+1, pt):
-        diag_idx = np.diagonal(idx, offset=offset)
-        P[offset+pt-1, diag_idx-1] = 1/np.sqrt(pt - np.abs(offset))
+    P[offsets + pt - 1, cols] = 1/np.sqrt(pt - np.abs(offsets))
     return P
 
 def prox_grad_robust_toeplitz_kron_pca(sample_cov, ps, pt, lambda_L, lambda_S, tau=0.1, tol=1e-8, max_iter=1000000, stop_cond_interval=20):
@@ -217,12 +223,14 @@ def prox_grad_robust_toeplitz_kron_pca(sample_cov, ps, pt, lambda_L, lambda_S, t
     tau : float
         Step size.
     tol : float
-        RMS element-wise difference between the current matrix and the matrix
-        from 'stop_cond_interval' iterations ago such that optimization terminates.
+        Optimization terminates when the largest elementwise change in L and
+        S since the last check drops below tol * max(|L|_max, 1).
     max_iter : int
         Maximum number of iterations of gradient descent.
     stop_cond_interval : int
-        Interval at which the termination condition is checked.
+        Initial interval at which the termination condition is checked. The
+        interval doubles after each failed check (capped at 200), so early
+        iterations test often and late iterations rarely.
 
     Returns
     ----------
@@ -237,39 +245,102 @@ def prox_grad_robust_toeplitz_kron_pca(sample_cov, ps, pt, lambda_L, lambda_S, t
     R = pv_rearrange(sample_cov, ps, pt)
     R_tilde = np.dot(P, R)
 
-    L_tilde_prev = np.copy(R_tilde)
-    S_tilde_prev = np.zeros(R_tilde.shape)
-    M_tilde_prev = L_tilde_prev + S_tilde_prev
+    #each column of P holds exactly one nonzero, so P.T @ X reduces to a
+    #row gather plus a scale; precompute the gather pattern once
+    P_rows = np.argmax(P != 0, axis=0)
+    P_scale = P[P_rows, np.arange(P.shape[1])][:, np.newaxis]
 
-    S_tilde = np.zeros(R_tilde.shape) #init so there's no error
+    c_vec = 1./np.sqrt(pt - np.abs(np.arange(-pt+1, pt, dtype=float)))
 
-    for k in range(max_iter):
+    L_tilde = np.copy(R_tilde)
+    S_tilde = np.zeros(R_tilde.shape)
+    M_tilde_prev = L_tilde + S_tilde
+    M_tilde = np.empty(R_tilde.shape) #second M buffer, recycled across iterations
 
-        L_tilde = soft_sv_threshold(M_tilde_prev - S_tilde_prev, tau*lambda_L)
-        for j in range(-pt+1, pt):
-            cj = 1./np.sqrt(pt - np.abs(j))
-            S_tilde[j+pt-1] = soft_entrywise_threshold(M_tilde_prev[j+pt-1]-L_tilde_prev[j+pt-1], tau*lambda_S*cj)
-        M_tilde = L_tilde + S_tilde - tau*(L_tilde + S_tilde - R_tilde)
+    L_rank = None
+    L_check, S_check = None, None
+    next_check = stop_cond_interval
 
-        M_tilde_prev, S_tilde_prev, L_tilde_prev = M_tilde, S_tilde, L_tilde
+    for k in range(max_iter):
 
-        if k % stop_cond_interval == 0:
-            cov_est = pv_rearrange_inv(np.dot(P.T, L_tilde + S_tilde), ps, pt)
-            if k > 0:
-                rms_diff = np.sqrt(np.mean((cov_est - cov_est_prev)**2))
-                if rms_diff < tol:
+        L_tilde_prev = L_tilde
+        L_tilde, L_rank = soft_sv_threshold(M_tilde_prev - S_tilde, tau*lambda_L,
+                                            k_guess=L_rank)
+        _prox_grad_step(M_tilde_prev, L_tilde_prev, L_tilde, R_tilde, tau,
+                        tau*lambda_S, c_vec, S_tilde, M_tilde)
+        M_tilde_prev, M_tilde = M_tilde, M_tilde_prev
+
+        #compare L and S directly instead of materializing the rearranged
+        #covariance estimate at every check -- elementwise reductions only
+        if k == next_check:
+            if L_check is not None:
+                diff = max(np.max(np.abs(L_tilde - L_check)),
+                           np.max(np.abs(S_tilde - S_check)))
+                if diff < tol*max(np.max(np.abs(L_tilde)), 1.):
                     break
-            cov_est_prev = cov_est
+                stop_cond_interval = min(2*stop_cond_interval, 200)
+            L_check = L_tilde
+            S_check = np.copy(S_tilde) #S_tilde is updated in place
+            next_check = k + stop_cond_interval
 
-    rank = np.linalg.matrix_rank(np.dot(P.T, L_tilde))
-    sparsity = np.sum(np.nonzero(S_tilde))/S_tilde.size
+    #the rearranged estimate is only needed for the return value
+    L_plus_S = L_tilde + S_tilde
+    cov_est = pv_rearrange_inv(L_plus_S[P_rows]*P_scale, ps, pt)
+
+    #P.T has orthonormal columns up to the row scaling, so the rank tracked by
+    #the last SV thresholding carries over to P.T @ L_tilde -- no extra SVD
+    rank = L_rank
+    sparsity = np.count_nonzero(S_tilde)/S_tilde.size
 
     return cov_est, rank, sparsity
 
 
-def cross_validate_toeplitz_fit(X_with_lags, ps, pt, lambda_L, lambda_S, num_folds=10, tau=0.1, tol=1e-8, max_iter=1000000, stop_cond_interval=20):
+def _cv_toeplitz_fold(X_with_lags, fold_size, cv_iter, total_ss, total_sum, ps, pt,
+                      lambda_L, lambda_S, tau, tol, max_iter, stop_cond_interval,
+                      blas_threads=None):
+    """Runs one cross-validation fold of the robust Toeplitz KronPCA fit.
+
+    total_ss and total_sum are the scatter matrix and column sums of the
+    full dataset, computed once by the caller; the fold's training
+    covariance is recovered by subtracting the held-out fold's contribution
+    instead of re-running the full O(samples * d^2) product per fold.
+
+    Returns the held-out log likelihood, rank and sparsity for the fold.
+    blas_threads caps BLAS threading so that fold-level parallelism does
+    not oversubscribe cores; None leaves BLAS threading untouched.
+    """
+    d = X_with_lags.shape[1]
+    with threadpool_limits(limits=blas_threads):
+        X_test = X_with_lags[cv_iter*fold_size : (cv_iter+1)*fold_size]
+
+        ss_test = np.dot(X_test.T, X_test)
+        num_train = len(X_with_lags) - len(X_test)
+        mean_train = (total_sum - X_test.sum(axis=0))/num_train
+        cov_train = (total_ss - ss_test)/num_train - np.outer(mean_train, mean_train)
+        cov_test = ss_test/len(X_test)
+
+        cov_reg_train, rank, sparsity = prox_grad_robust_toeplitz_kron_pca(cov_train, ps, pt, lambda_L, lambda_S,
+                                                                           tau=tau, tol=tol, max_iter=max_iter,
+                                                                           stop_cond_interval=stop_cond_interval)
+
+        if np.mean(np.abs(cov_reg_train)) < 1e-12:
+            print("Error: Regularized matrix is zero.")
+            return -np.inf, 0, 0
+
+        cov_reg_train_inv = np.linalg.inv(cov_reg_train)
+        log_det_cov_reg_train = np.linalg.slogdet(cov_reg_train)[1]
+
+        num_samples = len(X_test)
+        log_likelihood = -0.5*num_samples*(d*np.log(2*np.pi) + log_det_cov_reg_train + np.trace(np.dot(cov_reg_train_inv, cov_test)))
+
+    return log_likelihood, rank, sparsity
+
+
+def cross_validate_toeplitz_fit(X_with_lags, ps, pt, lambda_L, lambda_S, num_folds=10, tau=0.1, tol=1e-8, max_iter=1000000, stop_cond_interval=20, n_jobs=-1):
     """Computes the cross-validated log likelihood of KronPCA given values of the hyperparameters.
 
+    The folds are independent, so they are run in parallel with joblib.
+
     Parameters
     ----------
     X_with_lags : np.ndarray, shape (# samples, ps*pt)
@@ -285,7 +356,9 @@ def cross_validate_toeplitz_fit(X_with_lags, ps, pt, lambda_L, lambda_S, num_fol
     num_folds : int
         Number of partitions of the data for cross validation.
     tau, tol, max_iter, stop_cond_interval
-        See 'prox_grad_robust_toeplitz_kron_pca'. 
+        See 'prox_grad_robust_toeplitz_kron_pca'.
+    n_jobs : int
+        Number of joblib workers for the CV folds (-1 uses all cores).
 
     Returns
     ----------
@@ -297,47 +370,26 @@ def cross_validate_toeplitz_fit(X_with_lags, ps, pt, lambda_L, lambda_S, num_fol
         Sparsity values for each CV fold.
     """
     fold_size = int(np.floor(len(X_with_lags)/num_folds))
-    log_likelihood_vals = np.zeros(num_folds)
-    rank_vals = np.zeros(num_folds)
-    sparsity_vals = np.zeros(num_folds)
-    d = X_with_lags.shape[1]
-    
-    for cv_iter in range(num_folds):
-        
-        X_train = np.concatenate((X_with_lags[:cv_iter*fold_size], X_with_lags[(cv_iter+1)*fold_size:]), axis=0)
-        X_test = X_with_lags[cv_iter*fold_size : (cv_iter+1)*fold_size]
-        
-        X_train_ctd = X_train - X_train.mean(axis=0)
-        cov_train = np.dot(X_train_ctd.T, X_train_ctd)/len(X_train)
-        cov_test = np.dot(X_test.T, X_test)/len(X_test)
+    blas_threads = 1 if n_jobs != 1 else None
+    total_ss = np.dot(X_with_lags.T, X_with_lags)
+    total_sum = X_with_lags.sum(axis=0)
 
-        cov_reg_train, rank, sparsity = prox_grad_robust_toeplitz_kron_pca(cov_train, ps, pt, lambda_L, lambda_S,
-                                                                           tau=tau, tol=tol, max_iter=max_iter,
-                                                                           stop_cond_interval=stop_cond_interval)
-
-        if np.mean(np.abs(cov_reg_train)) < 1e-12:
-            print("Error: Regularized matrix is zero.")
-            log_likelihood_vals[cv_iter] = -np.inf
-            rank_vals[cv_iter] = 0
-            sparsity_vals[cv_iter] = 0
-            continue
-
-        cov_reg_train_inv = np.linalg.inv(cov_reg_train)
-        log_det_cov_reg_train = np.linalg.slogdet(cov_reg_train)[1]
-        
-        num_samples = len(X_test)
-        log_likelihood = -0.5*num_samples*(d*np.log(2*np.pi) + log_det_cov_reg_train + np.trace(np.dot(cov_reg_train_inv, cov_test)))
+    results = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_cv_toeplitz_fold)(X_with_lags, fold_size, cv_iter, total_ss, total_sum,
+                                   ps, pt, lambda_L, lambda_S,
+                                   tau, tol, max_iter, stop_cond_interval, blas_threads)
+        for cv_iter in range(num_folds))
+    results = np.array(results)
 
-        log_likelihood_vals[cv_iter] = log_likelihood
-        rank_vals[cv_iter] = rank
-        sparsity_vals[cv_iter] = sparsity
-        
-    return log_likelihood_vals, rank_vals, sparsity_vals
+    return results[:, 0], results[:, 1], results[:, 2]
 
 
-def regularize_cov(X_with_lags, ps, pt, lambda_L_vals, lambda_S_vals, num_folds=10, tau=0.1, tol=1e-8, max_iter=1000000, stop_cond_interval=20):
+def regularize_cov(X_with_lags, ps, pt, lambda_L_vals, lambda_S_vals, num_folds=10, tau=0.1, tol=1e-8, max_iter=1000000, stop_cond_interval=20, n_jobs=-1):
     """Regularizes the covariance matrix of X_with_lags using KronPCA with cross validation.
 
+    The full (lambda_L, lambda_S, fold) cartesian product is embarrassingly
+    parallel, so it is flattened into one joblib job list.
+
     Parameters
     ----------
     X_with_lags : np.ndarray, shape (# samples, ps*pt)
@@ -353,7 +405,10 @@ def regularize_cov(X_with_lags, ps, pt, lambda_L_vals, lambda_S_vals, num_folds=
     num_folds : int
         Number of partitions of the data for cross validation.
     tau, tol, max_iter, stop_cond_interval
-        See 'prox_grad_robust_toeplitz_kron_pca'. 
+        See 'prox_grad_robust_toeplitz_kron_pca'.
+    n_jobs : int
+        Number of joblib workers for the hyperparameter/fold grid
+        (-1 uses all cores).
 
     Returns
     ----------
@@ -366,24 +421,23 @@ def regularize_cov(X_with_lags, ps, pt, lambda_L_vals, lambda_S_vals, num_folds=
     sparsity_vals : np.ndarray, shape (# lambda_L vals, # lambda_S vals, num_folds)
         Sparsity values from cross validation.
     """
-    log_likelihood_vals = np.zeros(( len(lambda_L_vals), len(lambda_S_vals), num_folds ))
-    rank_vals = np.zeros(log_likelihood_vals.shape)
-    sparsity_vals = np.zeros(log_likelihood_vals.shape)
-
-    for lambda_L_idx in range(len(lambda_L_vals)):
-        for lambda_S_idx in range(len(lambda_S_vals)):
+    fold_size = int(np.floor(len(X_with_lags)/num_folds))
+    blas_threads = 1 if n_jobs != 1 else None
+    total_ss = np.dot(X_with_lags.T, X_with_lags)
+    total_sum = X_with_lags.sum(axis=0)
+
+    results = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_cv_toeplitz_fold)(X_with_lags, fold_size, cv_iter, total_ss, total_sum,
+                                   ps, pt, lambda_L, lambda_S,
+                                   tau, tol, max_iter, stop_cond_interval, blas_threads)
+        for lambda_L in lambda_L_vals
+        for lambda_S in lambda_S_vals
+        for cv_iter in range(num_folds))
+    results = np.array(results).reshape(len(lambda_L_vals), len(lambda_S_vals), num_folds, 3)
+    log_likelihood_vals = results[..., 0]
+    rank_vals = results[..., 1]
+    sparsity_vals = results[..., 2]
 
-            lambda_L, lambda_S = lambda_L_vals[lambda_L_idx], lambda_S_vals[lambda_S_idx]
-            print(lambda_L, lambda_S)
-        
-            log_likelihood_vals_cv, rank_vals_cv, sparsity_vals_cv = cross_validate_toeplitz_fit(X_with_lags, ps, pt, lambda_L, lambda_S,
-                                                                                                 num_folds=num_folds, tau=tau, tol=tol, max_iter=max_iter,
-                                                                                                 stop_cond_interval=stop_cond_interval)
-            
-            log_likelihood_vals[lambda_L_idx, lambda_S_idx] = log_likelihood_vals_cv
-            rank_vals[lambda_L_idx, lambda_S_idx] = rank_vals_cv
-            sparsity_vals[lambda_L_idx, lambda_S_idx] = sparsity_vals_cv
-    
     ll_mean = log_likelihood_vals.mean(axis=2)
     max_idx = np.unravel_index(ll_mean.argmax(), ll_mean.shape)
     lambda_L_opt, lambda_S_opt = lambda_L_vals[max_idx[0]], lambda_S_vals[max_idx[1]]
@@ -14,6 +14,8 @@ from dca.cov_util import (calc_cross_cov_mats_from_cov,
                           calc_pi_from_cov,
                           calc_pi_from_data,
                           project_cross_cov_mats,
+                          pv_rearrange,
+                          pv_rearrange_inv,
                           toeplitzify)
 
 
@@ -150,6 +152,20 @@ def test_projected_cov_calc(lorenz_dataset):
     assert_allclose(tcov.numpy(), cov2)
 
 
+def test_pv_rearrange_round_trip():
+    """Test that pv_rearrange vectorizes each block of a matrix and that
+    pv_rearrange_inv inverts the rearrangement."""
+    rng = np.random.RandomState(20200226)
+    T, N = 4, 3
+    C = rng.randn(T * N, T * N)
+    C_prime = pv_rearrange(C, T, N)
+    for i in range(T):
+        for j in range(T):
+            block = C[i * N:(i + 1) * N, j * N:(j + 1) * N]
+            assert_allclose(C_prime[i * T + j], block.T.ravel())
+    assert_allclose(pv_rearrange_inv(C_prime, T, N), C)
+
+
 def test_regularize_cov(lorenz_dataset):
     _, _, X, _, _ = lorenz_dataset
     X = X[:, :3]
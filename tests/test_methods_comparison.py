@@ -3,7 +3,9 @@ from scipy.linalg import block_diag
 from numpy.testing import (assert_allclose)
 import pytest
 
-from dca.methods_comparison import (make_block_diag, block_dot_A, block_dot_B,
+from dca.methods_comparison import (calc_K, calc_big_K, big_K_dot_Ct,
+                                    block_diag_add,
+                                    make_block_diag, block_dot_A, block_dot_B,
                                     block_dot_AB, matrix_inversion_identity,
                                     ForecastableComponentsAnalysis as FCA,
                                     GaussianProcessFactorAnalysis as GPFA,
@@ -47,6 +49,23 @@ def test_SFA(noise_dataset):
     model.fit_transform(X)
 
 
+def test_SFA_matches_svd(noise_dataset):
+    """Test that the eigh-based SFA fit matches the SVD formulation
+    (up to column signs)."""
+    X = noise_dataset
+    model = SFA(n_components=3).fit(X)
+
+    X_stan = X - X.mean(axis=0, keepdims=True)
+    uX, sX, vhX = np.linalg.svd(X_stan, full_matrices=False)
+    whiten = vhX.T @ np.diag(1. / sX)
+    Xp = np.diff(X_stan @ whiten, axis=0)
+    up, sp, vhp = np.linalg.svd(Xp, full_matrices=False)
+    ref = whiten @ vhp.T[:, ::-1]
+    ref /= np.linalg.norm(ref, axis=0, keepdims=True)
+
+    assert_allclose(np.abs(model.all_coef_), np.abs(ref), atol=1e-8)
+
+
 def test_jpca_n_components_check():
     """ Test that JPCA will throw an error when n_components
     is higher than number of features in X"""
@@ -92,6 +111,34 @@ def test_JPCA_skew_symmetric():
     assert np.isclose(M_skew.T, -M_skew).all()
 
 
+def test_calc_big_K():
+    """Test the vectorized GP kernel against the per-element definition."""
+    rng = np.random.RandomState(20200226)
+    T, nf = 6, 3
+    tau = rng.rand(nf) + .5
+    var_n = 1e-2
+    K = calc_big_K(T, nf, tau, var_n)
+    for i in range(T):
+        for j in range(T):
+            for f in range(nf):
+                for g in range(nf):
+                    if f == g:
+                        assert_allclose(K[i * nf + f, j * nf + g],
+                                        calc_K(tau[f], i - j, var_n))
+                    else:
+                        assert K[i * nf + f, j * nf + g] == 0.
+
+
+def test_big_K_dot_Ct():
+    """Test the structured K @ block_diag(C.T) product against the dense one."""
+    rng = np.random.RandomState(20200226)
+    T, n, nf = 6, 4, 2
+    tau = rng.rand(nf) + .5
+    K = calc_big_K(T, nf, tau, 1e-2)
+    C = rng.randn(n, nf)
+    assert_allclose(big_K_dot_Ct(K, C, T), K.dot(make_block_diag(C.T, T)))
+
+
 def test_make_block_diag():
     T, n, d = 5, 3, 2
     M = np.random.randn(d, n)
@@ -100,6 +147,14 @@ def test_make_block_diag():
     assert_allclose(A, Ap)
 
 
+def test_block_diag_add():
+    T, n = 5, 3
+    R = np.diag(np.random.rand(n))
+    A = np.random.randn(T * n, T * n)
+    expected = A + make_block_diag(R, T)
+    assert_allclose(block_diag_add(A.copy(), R, T), expected)
+
+
 def test_block_dot_A():
     T, n, d = 5, 3, 2
     M = np.random.randn(d, n)